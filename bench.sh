@@ -0,0 +1,4 @@
+#!/bin/sh
+# Runs the tutorial pipelines headless on synthetic taxi data.
+
+python benchmarks/pipelines.py "$@"
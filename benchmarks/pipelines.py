@@ -0,0 +1,577 @@
+"""
+Headless benchmarks of the tutorial pipelines on synthetic taxi data.
+
+The tutorials load the New York taxi trips from the network; this script
+generates deterministic taxi-like CSV/bz2 files locally instead and runs
+the dataflows of userguide1.0 to userguide1.6 and of the
+MulticlassScatterplotDemo without displaying anything.
+
+With --record DIR, the chunks read by the loader, the interaction events
+and their times are saved in DIR/<pipeline>.json. With --replay FILE, the
+slider moves of userguide1.3 are taken from FILE, either saved by
+--record or by the recording cells of the userguide1.3 notebook. When FILE
+has chunks, the pipelines loading a single file read the same chunks
+with the ReplayCSVLoader of replay_loader.py, a CSVLoader reading the
+recorded sizes instead of the sizes chosen by the scheduler, so replays
+and other runs measure the same loading code. Other pipelines cannot be
+replayed.
+
+Usage:
+    python benchmarks/pipelines.py
+    python benchmarks/pipelines.py --rows 100000 userguide1.1 userguide1.3
+    python benchmarks/pipelines.py --replay userguide1.3-session.json userguide1.3
+
+Pipelines with input modules, e.g., the Variables of userguide1.3, never
+end by themselves (Pipeline.endless); they are stopped once their scenario is played, the
+loader is terminated and no frame was computed for SETTLE_TIME seconds,
+and their completion time is the time of their last frame.
+
+Each pipeline runs in its own process so that its peak RSS is not mixed
+with the others. The results are printed as JSON lines tagged with the
+current git commit, so they can be compared across commits.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import bz2
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import zlib
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+RESOLUTION = 512
+# Seconds without a new frame after which a pipeline that cannot end by
+# itself is considered complete; its completion time is its last frame
+SETTLE_TIME = 1.0
+COLUMNS = [
+    "passenger_count", "trip_distance",
+    "pickup_longitude", "pickup_latitude",
+    "dropoff_longitude", "dropoff_latitude",
+    "fare_amount",
+]
+col_x = "pickup_longitude"
+col_y = "pickup_latitude"
+
+
+@dataclass
+class Bounds:  # NYC bounds, as in the tutorials
+    top: float = 40.92
+    bottom: float = 40.49
+    left: float = -74.27
+    right: float = -73.68
+
+
+bounds = Bounds()
+
+
+# Synthetic data
+
+def _taxi_chunk(rng: np.random.Generator, rows: int, outliers: float) -> pd.DataFrame:
+    pickup_lon = rng.normal(-73.98, 0.04, rows)
+    pickup_lat = rng.normal(40.75, 0.03, rows)
+    dropoff_lon = pickup_lon + rng.normal(0, 0.02, rows)
+    dropoff_lat = pickup_lat + rng.normal(0, 0.02, rows)
+    # Like the real data, a few trips have null or far away coordinates
+    wrong = np.flatnonzero(rng.random(rows) < outliers)
+    far = rng.random(len(wrong)) < 0.5
+    for coords, low, high in ((pickup_lon, -125, -65), (pickup_lat, 25, 50),
+                              (dropoff_lon, -125, -65), (dropoff_lat, 25, 50)):
+        coords[wrong] = np.where(far, rng.uniform(low, high, len(wrong)), 0.0)
+    distance = np.hypot(dropoff_lon - pickup_lon, dropoff_lat - pickup_lat) * 69
+    return pd.DataFrame({
+        "passenger_count": rng.integers(1, 7, rows),
+        "trip_distance": distance,
+        "pickup_longitude": pickup_lon,
+        "pickup_latitude": pickup_lat,
+        "dropoff_longitude": dropoff_lon,
+        "dropoff_latitude": dropoff_lat,
+        "fare_amount": 2.5 + 2.5 * distance,
+    })
+
+
+def make_taxi_file(
+    filename: str,
+    rows: int,
+    outliers: float = 0.001,
+    columns: List[str] = COLUMNS,
+    seed: int = 0,
+    chunk_size: int = 100_000,
+) -> str:
+    "Write a taxi-like CSV/bz2 file; the same arguments give the same file"
+    if os.path.exists(filename):
+        return filename
+    rng = np.random.default_rng(seed)
+    tmp = filename + ".tmp"
+    with bz2.open(tmp, "wt") as out:
+        for start in range(0, rows, chunk_size):
+            df = _taxi_chunk(rng, min(chunk_size, rows - start), outliers)
+            df[columns].to_csv(out, index=False, header=(start == 0), float_format="%.6f")
+    os.replace(tmp, filename)
+    return filename
+
+
+# Sessions
+
+# Seconds before userguide1.3 sets the initial ranges, as in the notebook
+INITIAL_DELAY = 1.0
+# Slider moves of userguide1.3: (seconds since the initial ranges were set,
+# longitude range, latitude range); offsets rather than delays between
+# moves, so the time taken to send a move does not delay the next ones
+SLIDER_EVENTS = [
+    (0.5, (-74.1, -73.8), (40.6, 40.9)),
+    (1.0, (-74.05, -73.9), (40.7, 40.8)),
+    (1.5, (-74.1, -73.8), (40.6, 40.9)),
+    (2.0, (bounds.left, bounds.right), (bounds.bottom, bounds.top)),
+]
+
+
+class Session:
+    "The interaction events to play, and the log of what happened during a run"
+    def __init__(
+        self, slider_events: List[Any] = SLIDER_EVENTS, chunk_sizes: List[int] | None = None
+    ) -> None:
+        self.slider_events = slider_events
+        self.chunk_sizes = chunk_sizes  # rows of each chunk to read, None to let the scheduler decide
+        self.start = time.perf_counter()
+        self.origin = self.start  # time the initial ranges were set
+        self.chunks: List[Any] = []  # (time, rows read so far)
+        self.events: List[Any] = []  # same format as SLIDER_EVENTS
+        self.edits: List[Any] = []  # (time, description) of dataflow changes
+
+    @staticmethod
+    def load(filename: str) -> Session:
+        "Load a session saved by save() or by the userguide1.3 notebook"
+        with open(filename) as inp:
+            saved = json.load(inp)
+        chunks = saved.get("chunks")
+        chunk_sizes = None
+        if chunks:  # cumulative rows read, replayed as the size of each chunk
+            rows = [0, *(rows for _, rows in chunks)]
+            chunk_sizes = [rows[i + 1] - rows[i] for i in range(len(chunks))]
+        return Session(saved.get("events") or SLIDER_EVENTS, chunk_sizes)
+
+    def chunk(self, m: Any, r: int) -> None:
+        rows = 0 if m.result is None else len(m.result)
+        if not self.chunks or self.chunks[-1][1] != rows:
+            self.chunks.append((time.perf_counter() - self.start, rows))
+
+    async def wait_event(self, offset: float) -> None:
+        "Wait until offset seconds after the initial ranges were set"
+        await asyncio.sleep(self.origin + offset - time.perf_counter())
+
+    def event(self, long_range: Any, lat_range: Any) -> None:
+        self.events.append((time.perf_counter() - self.origin, long_range, lat_range))
+
+    def edit(self, description: str) -> None:
+        self.edits.append((time.perf_counter() - self.start, description))
+
+    def save(self, filename: str) -> None:
+        with open(filename, "w") as out:
+            json.dump({"events": self.events, "chunks": self.chunks, "edits": self.edits}, out)
+
+
+# Pipelines
+
+@dataclass
+class Pipeline:
+    loader: Any  # the module reading the files
+    frame: Any  # the module producing what would be displayed
+    scenario: Callable[[Session], Awaitable[None]] | None = None  # user interactions
+    endless: bool = False  # True when input modules keep the scheduler running
+    frame_callbacks: List[Callable[[Any, int], None]] = field(default_factory=list)
+
+    def on_frame(self, callback: Callable[[Any, int], None]) -> None:
+        "Call callback after each run of the frame module, even if it is replaced"
+        self.frame_callbacks.append(callback)
+        self.frame.on_after_run(callback)
+
+    def set_frame(self, frame: Any) -> None:
+        "Replace the frame module, e.g., when a scenario deletes it"
+        self.frame = frame
+        for callback in self.frame_callbacks:
+            frame.on_after_run(callback)
+
+
+def _csv_loader(filename: str, session: Session, s: Any) -> Any:
+    "Create the loader of the pickup columns, reading the recorded chunks if any"
+    if session.chunk_sizes is None:
+        from progressivis import CSVLoader
+        return CSVLoader(filename, usecols=[col_x, col_y], scheduler=s)
+    from replay_loader import ReplayCSVLoader
+    return ReplayCSVLoader(filename, session.chunk_sizes, usecols=[col_x, col_y], scheduler=s)
+
+
+def _heatmap(table: Any, min_: Any, max_: Any, s: Any) -> Any:
+    "Connect a Histogram2D and a Heatmap to a table and its bounds, return the Heatmap"
+    from progressivis import Histogram2D, Heatmap
+    histogram2d = Histogram2D(col_x, col_y, xbins=RESOLUTION, ybins=RESOLUTION, scheduler=s)
+    heatmap = Heatmap(scheduler=s)
+    histogram2d.input.table = table
+    histogram2d.input.min = min_
+    histogram2d.input.max = max_
+    heatmap.input.array = histogram2d.output.result
+    return heatmap
+
+
+async def _wait_progress(loader: Any, fraction: float) -> None:
+    "Wait until the loader has read a fraction of its input, or is terminated"
+    while not loader.is_terminated():
+        current, total = loader.get_progress()
+        if total and current >= fraction * total:
+            return
+        await asyncio.sleep(0.05)
+
+
+def userguide1_0(filenames: List[str], s: Any, session: Session) -> Pipeline:
+    from progressivis import Quantiles
+    csv = _csv_loader(filenames[0], session, s)
+    quantiles = Quantiles(scheduler=s)
+    quantiles.input.table = csv.output.result
+    heatmap = _heatmap(csv.output.result, quantiles.output.result[0.03],
+                       quantiles.output.result[0.97], s)
+    return Pipeline(csv, heatmap)
+
+
+def userguide1_1(filenames: List[str], s: Any, session: Session) -> Pipeline:
+    from progressivis import Min, Max
+    csv = _csv_loader(filenames[0], session, s)
+    min_ = Min(name="min", scheduler=s)
+    max_ = Max(name="max", scheduler=s)
+    min_.input.table = csv.output.result
+    max_.input.table = csv.output.result
+    heatmap = _heatmap(csv.output.result, min_.output.result, max_.output.result, s)
+    return Pipeline(csv, heatmap)
+
+
+def userguide1_2(filenames: List[str], s: Any, session: Session) -> Pipeline:
+    from progressivis import ConstDict, PDict
+    csv = _csv_loader(filenames[0], session, s)
+    min_ = ConstDict(PDict({col_x: bounds.left, col_y: bounds.bottom}), scheduler=s)
+    max_ = ConstDict(PDict({col_x: bounds.right, col_y: bounds.top}), scheduler=s)
+    heatmap = _heatmap(csv.output.result, min_.output.result, max_.output.result, s)
+    return Pipeline(csv, heatmap)
+
+
+def userguide1_3(filenames: List[str], s: Any, session: Session) -> Pipeline:
+    from progressivis import BinningIndexND, RangeQuery2D, Variable
+    csv = _csv_loader(filenames[0], session, s)
+    index = BinningIndexND(scheduler=s)
+    query = RangeQuery2D(column_x=col_x, column_y=col_y, scheduler=s)
+    var_min = Variable(name="var_min", scheduler=s)
+    var_max = Variable(name="var_max", scheduler=s)
+    index.input.table = csv.output.result[col_x, col_y]
+    query.input.lower = var_min.output.result
+    query.input.upper = var_max.output.result
+    query.input.index = index.output.result
+    query.input.min = index.output.min_out
+    query.input.max = index.output.max_out
+    heatmap = _heatmap(query.output.result, query.output.min, query.output.max, s)
+
+    async def _scenario(session: Session) -> None:
+        await asyncio.sleep(INITIAL_DELAY)  # give it a bit of time to start
+        await var_min.from_input({col_x: bounds.left, col_y: bounds.bottom})
+        await var_max.from_input({col_x: bounds.right, col_y: bounds.top})
+        session.origin = time.perf_counter()
+        for offset, (long_min, long_max), (lat_min, lat_max) in session.slider_events:
+            await session.wait_event(offset)
+            session.event((long_min, long_max), (lat_min, lat_max))
+            await var_min.from_input({col_x: long_min, col_y: lat_min})
+            await var_max.from_input({col_x: long_max, col_y: lat_max})
+
+    return Pipeline(csv, heatmap, _scenario, endless=True)
+
+
+def userguide1_4(filenames: List[str], s: Any, session: Session) -> Pipeline:
+    "The dataflow of userguide1.2, with the quality and progress monitored"
+    pipeline = userguide1_2(filenames, s, session)
+
+    def _monitor(m: Any, r: int) -> None:
+        m.get_progress()
+        m.get_quality()
+
+    pipeline.on_frame(_monitor)
+    return pipeline
+
+
+def userguide1_5(filenames: List[str], s: Any, session: Session) -> Pipeline:
+    from progressivis import Every, Min, Max
+    csv = _csv_loader(filenames[0], session, s)
+    m = Min(name="min", scheduler=s)
+    prt = Every(proc=_quiet, scheduler=s)
+    m.input.table = csv.output.result
+    prt.input.df = m.output.result
+
+    async def _scenario(session: Session) -> None:
+        # The edits depend on the progress, not on the time, so that they
+        # happen at the same point of the load on a faster machine
+        await _wait_progress(csv, 1 / 3)
+        session.edit("add max")
+        with s:
+            M = Max(name="max", scheduler=s)
+            prt2 = Every(proc=_quiet, scheduler=s)
+            M.input.table = csv.output.result
+            prt2.input.df = M.output.result
+        pipeline.set_frame(M)  # min is deleted below
+        await _wait_progress(csv, 2 / 3)
+        session.edit("delete min")
+        with s as dataflow:
+            dataflow.delete_modules(*dataflow.collateral_damage("min"))
+
+    pipeline = Pipeline(csv, m, _scenario)
+    return pipeline
+
+
+def userguide1_6(filenames: List[str], s: Any, session: Session) -> Pipeline:
+    from progressivis import Quantiles
+    pipeline = userguide1_1(filenames, s, session)
+    csv = pipeline.loader
+
+    async def _scenario(session: Session) -> None:
+        await _wait_progress(csv, 1 / 2)
+        session.edit("replace min and max with quantiles")
+        with s as dataflow:
+            quant2 = Quantiles(scheduler=s)
+            quant2.input.table = csv.output.result
+            heatmap = _heatmap(quant2.output.table, quant2.output.result[0.03],
+                               quant2.output.result[0.97], s)
+            dataflow.delete_modules(*dataflow.collateral_damage("min", "max"))
+        pipeline.set_frame(heatmap)  # the first heatmap is deleted with min and max
+
+    pipeline.scenario = _scenario
+    return pipeline
+
+
+def multiclass_scatterplot(filenames: List[str], s: Any, session: Session) -> Pipeline:
+    from progressivis import Every, PTable, CSVLoader, Constant
+    from progressivis.vis import MCScatterPlot
+
+    def _filter(df: pd.DataFrame) -> pd.DataFrame:
+        pklon = df['pickup_longitude']
+        pklat = df['pickup_latitude']
+        dolon = df['dropoff_longitude']
+        dolat = df['dropoff_latitude']
+        return df[(pklon > -74.08) & (pklon < -73.5) &
+                  (pklat > 40.55) & (pklat < 41.00) &
+                  (dolon > -74.08) & (dolon < -73.5) &
+                  (dolat > 40.55) & (dolat < 41.00)]
+
+    cst = Constant(PTable('filenames', data=pd.DataFrame({'filename': filenames})), scheduler=s)
+    csv = CSVLoader(usecols=['pickup_longitude', 'pickup_latitude',
+                             'dropoff_longitude', 'dropoff_latitude'],
+                    filter_=_filter, scheduler=s)
+    csv.input.filenames = cst.output[0]
+    pr = Every(scheduler=s, proc=_quiet)
+    pr.input.df = csv.output[0]
+    multiclass = MCScatterPlot(
+        scheduler=s,
+        classes=[
+            ('pickup', 'pickup_longitude', 'pickup_latitude'),
+            ('dropoff', 'dropoff_longitude', 'dropoff_latitude')
+        ],
+        approximate=True)
+    multiclass.create_dependent_modules(csv, 'result')
+    return Pipeline(csv, multiclass, endless=True)  # MCScatterPlot creates Variables
+
+
+def userguide1_2_pandas(filenames: List[str]) -> None:
+    "Non progressive version: nothing is shown before everything is computed"
+    df = pd.read_csv(filenames[0], index_col=False, usecols=[col_x, col_y])
+    lon = df[col_x]
+    lat = df[col_y]
+    df = df[(lon > bounds.left) & (lon < bounds.right) &
+            (lat > bounds.bottom) & (lat < bounds.top)]
+    np.histogram2d(df[col_x], df[col_y], bins=(RESOLUTION, RESOLUTION))
+
+
+def _quiet(_: Any) -> None:
+    pass
+
+
+PIPELINES: Dict[str, Callable[[List[str], Any, Session], Pipeline]] = {
+    "userguide1.0": userguide1_0,
+    "userguide1.1": userguide1_1,
+    "userguide1.2": userguide1_2,
+    "userguide1.3": userguide1_3,
+    "userguide1.4": userguide1_4,
+    "userguide1.5": userguide1_5,
+    "userguide1.6": userguide1_6,
+    "MulticlassScatterplotDemo": multiclass_scatterplot,
+}
+NON_PROGRESSIVE: Dict[str, Callable[[List[str]], None]] = {
+    "userguide1.2-pandas": userguide1_2_pandas,
+}
+
+
+# Runner
+
+def run_pipeline(
+    name: str, filenames: List[str], timeout: float, session: Session
+) -> Dict[str, Any]:
+    "Run one pipeline in this process and return its measures"
+    first_frame: float | None = None
+    end: float | None = None
+    timed_out = False
+    if name in NON_PROGRESSIVE:
+        start = session.start = time.perf_counter()
+        NON_PROGRESSIVE[name](filenames)
+        first_frame = time.perf_counter() - start
+    else:
+        # Importing progressivis takes seconds, it is not part of the measures
+        from progressivis import Scheduler
+        from progressivis.core import aio
+        s = Scheduler()
+        pipeline = PIPELINES[name](filenames, s, session)
+        start = session.start = time.perf_counter()
+        last_frame = start
+
+        def _frame(m: Any, r: int) -> None:
+            nonlocal first_frame, last_frame
+            last_frame = time.perf_counter()
+            if first_frame is None:
+                first_frame = last_frame - start
+
+        pipeline.on_frame(_frame)
+        pipeline.loader.on_after_run(session.chunk)
+
+        async def _done() -> None:
+            # Pipelines with input modules, e.g., Variable, never end by
+            # themselves: they are done once the scenario is played, the
+            # loader is terminated and the frame has not changed for a while
+            if pipeline.scenario is not None:
+                await pipeline.scenario(session)
+            # Other pipelines end by themselves, the scheduler ends first
+            while not (
+                pipeline.endless and pipeline.loader.is_terminated()
+                and time.perf_counter() - last_frame > SETTLE_TIME
+            ):
+                await asyncio.sleep(0.1)
+
+        async def _main() -> None:
+            nonlocal end, timed_out
+            running = asyncio.ensure_future(s.start())
+            done = asyncio.ensure_future(_done())
+            await asyncio.wait([running, done], timeout=timeout,
+                               return_when=asyncio.FIRST_COMPLETED)
+            if running.done():
+                end = time.perf_counter()
+            else:
+                if done.done():
+                    end = last_frame
+                else:
+                    timed_out = True
+                    end = time.perf_counter()
+                await s.stop()
+                await running
+            done.cancel()
+
+        aio.run(_main())
+    return {
+        "first_frame": first_frame,
+        "completion": (time.perf_counter() if end is None else end) - start,
+        "timed_out": timed_out,
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            text=True, stderr=subprocess.DEVNULL,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("pipelines", nargs="*", default=[*PIPELINES, *NON_PROGRESSIVE],
+                        help="pipelines to run, all by default")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="rows per file")
+    parser.add_argument("--files", type=int, default=2,
+                        help="number of files, only MulticlassScatterplotDemo reads more than one")
+    parser.add_argument("--outliers", type=float, default=0.001, help="rate of outlier trips")
+    parser.add_argument("--columns", default=",".join(COLUMNS), help="columns of the files")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=600, help="seconds before a pipeline is stopped")
+    parser.add_argument("--data", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"),
+                        help="directory of the generated files")
+    parser.add_argument("--record", metavar="DIR", help="save the chunks and events of each pipeline in DIR")
+    parser.add_argument("--replay", metavar="FILE", help="replay the slider moves and chunks saved in FILE")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.replay:
+        replay = Session.load(args.replay)
+        for name in args.pipelines:
+            # The slider moves are only played by userguide1.3, the chunks
+            # are read by the pipelines loading a single file
+            replayed = name == "userguide1.3" or (
+                replay.chunk_sizes is not None and name in PIPELINES
+                and name != "MulticlassScatterplotDemo"
+            )
+            if not replayed:
+                parser.error(f"'{name}' does not replay anything from {args.replay}")
+    os.makedirs(args.data, exist_ok=True)
+    columns = args.columns.split(",")
+    filenames = [
+        make_taxi_file(
+            os.path.join(args.data, f"taxi-{args.rows}-{args.outliers}-{args.seed + i}"
+                         f"-{zlib.crc32(args.columns.encode()):08x}.csv.bz2"),
+            args.rows, args.outliers, columns, args.seed + i)
+        for i in range(args.files)
+    ]
+    if args.child:
+        name = args.pipelines[0]
+        session = Session.load(args.replay) if args.replay else Session()
+        result = run_pipeline(name, filenames, args.timeout, session)
+        if args.record:
+            session.save(os.path.join(args.record, f"{name}.json"))
+        print("RESULT", json.dumps(result))
+        return
+    if args.record:
+        os.makedirs(args.record, exist_ok=True)
+    options = [f"--{option}={os.path.abspath(getattr(args, option))}"
+               for option in ("record", "replay") if getattr(args, option)]
+    commit = _git_commit()
+    for name in args.pipelines:
+        if name not in PIPELINES and name not in NON_PROGRESSIVE:
+            parser.error(f"unknown pipeline '{name}'")
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", name,
+             "--rows", str(args.rows), "--files", str(args.files),
+             "--outliers", str(args.outliers), "--columns", args.columns,
+             "--seed", str(args.seed), "--timeout", str(args.timeout),
+             "--data", args.data, *options],
+            capture_output=True, text=True, check=False,
+        )
+        lines = [line for line in proc.stdout.splitlines() if line.startswith("RESULT ")]
+        if proc.returncode != 0 or not lines:
+            print(f"{name} failed:\n{proc.stderr}", file=sys.stderr)
+            continue
+        result = json.loads(lines[-1][len("RESULT "):])
+        rows = args.rows * (args.files if name == "MulticlassScatterplotDemo" else 1)
+        print(json.dumps({
+            "commit": commit,
+            "pipeline": name,
+            "rows": rows,
+            "time_to_first_frame": result["first_frame"],
+            "time_to_completion": result["completion"],
+            "rows_per_s": rows / result["completion"],
+            "peak_rss": result["peak_rss"],
+            "timed_out": result["timed_out"],
+        }), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+"""
+CSV loader reading the chunk sizes recorded in a benchmark session.
+
+It is the CSVLoader used by the recorded and normal runs, except that
+run_step reads the next recorded size instead of step_size, so a replay
+appends the same chunks to the table as the recorded run, whatever the
+speed of the machine, with the same loading code. Once the recorded sizes
+are used up, e.g., when the file is larger than the recorded one, it falls
+back to step_size.
+"""
+from __future__ import annotations
+
+from progressivis import CSVLoader
+from progressivis.core.module import ReturnRunStep
+
+from typing import (Any, List)
+
+
+class ReplayCSVLoader(CSVLoader):
+    def __init__(self, filepath_or_buffer: Any, chunk_sizes: List[int], **kwds: Any) -> None:
+        super().__init__(filepath_or_buffer, **kwds)
+        self.chunk_sizes = chunk_sizes
+        self._next_chunk = 0
+
+    def run_step(
+        self, run_number: int, step_size: int, quantum: float
+    ) -> ReturnRunStep:
+        if self._next_chunk < len(self.chunk_sizes):  # replay
+            step_size = self.chunk_sizes[self._next_chunk]
+            self._next_chunk += 1
+        return super().run_step(run_number, step_size, quantum)
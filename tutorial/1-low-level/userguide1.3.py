@@ -130,6 +130,8 @@ await var_max.from_input(bnds_max)
 
 # %% [markdown]
 # ## Create the Widgets
+# Slider events can arrive in bursts. The observer below only keeps the latest ranges and sends them
+# from a single task, so the query is not recomputed for intermediate values; `dropped_updates` counts them.
 
 # %%
 import ipywidgets as widgets
@@ -158,13 +160,37 @@ lat_slider = widgets.FloatRangeSlider(
     readout_format='.1f',
 )
 
+# Last ranges sent to the query, used to skip sending the same ranges again
+last_ranges = (long_slider.value, lat_slider.value)
+# Only the latest ranges are sent; bursts of events replace the pending ones
+pending_ranges = None
+sender = None
+dropped_updates = 0  # number of intermediate ranges that were never sent
+
+
+async def _send_ranges():
+    global last_ranges, pending_ranges, sender
+    try:
+        while pending_ranges is not None:
+            ranges, pending_ranges = pending_ranges, None
+            if ranges == last_ranges:
+                continue  # e.g., a burst moved back, the query already selects these ranges
+            last_ranges = ranges
+            (long_min, long_max), (lat_min, lat_max) = ranges
+            await var_min.from_input({col_x: long_min, col_y: lat_min})
+            await var_max.from_input({col_x: long_max, col_y: lat_max})
+    finally:
+        sender = None  # the next slider move starts a new task, even after an error
+
+
 def observer(_):
-    async def _coro():
-        long_min, long_max = long_slider.value
-        lat_min, lat_max = lat_slider.value
-        await var_min.from_input({col_x: long_min, col_y: lat_min})
-        await var_max.from_input({col_x: long_max, col_y: lat_max})
-    aio.create_task(_coro())
+    global pending_ranges, sender, dropped_updates
+    ranges = (long_slider.value, lat_slider.value)
+    if pending_ranges is not None:
+        dropped_updates += 1
+    pending_ranges = ranges
+    if sender is None:  # a single task sends the ranges, min and max together
+        sender = aio.create_task(_send_ranges())
 
 
 long_slider.observe(observer, "value")
@@ -186,6 +212,26 @@ except:
 # Show what runs
 csv.scheduler
 
+# %% [markdown]
+# ## Record the Session
+# Optionally, the slider moves can be recorded and replayed as a benchmark, with the same moves at the same pace,
+# using `./bench.sh --replay userguide1.3-session.json userguide1.3`.
+# To record the moves, uncomment the next cell and run it before moving the sliders; uncomment and run the one after to save them.
+
+# %%
+# import time
+# recording_start = time.perf_counter()
+# recorded_events = []  # (seconds since the recording started, longitude range, latitude range)
+# def record(_):
+#     recorded_events.append((time.perf_counter() - recording_start, long_slider.value, lat_slider.value))
+# long_slider.observe(record, "value")
+# lat_slider.observe(record, "value")
+
+# %%
+# import json
+# with open("userguide1.3-session.json", "w") as out:
+#     json.dump({"events": recorded_events}, out)
+
 # %% [markdown]
 # ## Stop the scheduler
 # To stop the scheduler, uncomment the next cell and run it
@@ -184,6 +184,179 @@ heatq.height = 100
 # %%
 display_progress_bar(heatmap)
 
+# %% [markdown]
+# ## Detecting Convergence
+# A module whose quality stays stable has converged for now; running it more often will not change what is shown.
+# The following function watches the quality after each run and shows when all its measures have changed by less than
+# `tolerance` for `runs` consecutive runs. It returns to invalid as soon as the quality changes again, e.g., when new data arrives.
+
+
+# %%
+def display_convergence(mod: Module, tolerance: float = 1e-3, runs: int = 5) -> ipw.Valid:
+    valid_wg = ipw.Valid(value=False, description="Converged")
+    previous: dict[str, float] = {}
+    stable = 0
+
+    def _proc(m: Module, r: int) -> None:
+        nonlocal previous, stable
+        measures = m.get_quality()
+        if measures is None:
+            return
+        if previous.keys() == measures.keys() and all(
+            abs(measures[key] - previous[key]) <= tolerance for key in measures
+        ):
+            stable += 1
+        else:
+            stable = 0
+        previous = dict(measures)
+        valid_wg.value = stable >= runs
+    mod.on_after_run(_proc)
+    return valid_wg
+
+
+# %%
+display_convergence(histogram2d)
+
+# %% [markdown]
+# ## Profiling the Modules
+# Printing the scheduler shows the state of the modules, but not where the time goes.
+# The `ModuleProfiler` below records, for each module, the number of runs, the wall and CPU time spent in `run_step`,
+# the number of rows processed, and the idle time between the end of a run and the start of the next one.
+# The rows processed are taken from the module's own input tables (rows already consumed, i.e., not waiting in `created`),
+# or from the progress for the loaders. The idle time is not the time spent blocked:
+# a module can be idle because it is waiting for data, or only because other modules are running.
+# The callbacks only update counters, the table and trace are computed on demand.
+#
+# The trace can be loaded in [Perfetto](https://ui.perfetto.dev) or `chrome://tracing`.
+
+# %%
+import json
+import time
+
+import pandas as pd
+
+
+class ModuleProfiler:
+    def __init__(self, mods: list[Module]) -> None:
+        self.modules = mods
+        self.stats: dict[str, dict[str, float]] = {}
+        self.events: list[tuple[str, float, float]] = []
+        self._origin = time.perf_counter()
+        self._started: dict[str, tuple[float, float]] = {}
+        self._ended: dict[str, float] = {}
+        self._consumed_rows: dict[str, int] = {}
+        for mod in mods:
+            self.stats[mod.name] = {"runs": 0, "wall": 0.0, "cpu": 0.0, "rows": 0, "idle": 0.0}
+            mod.on_before_run(self._start_run)
+            mod.on_after_run(self._after_run)
+
+    def _start_run(self, m: Module, run_number: int) -> None:
+        now = time.perf_counter()
+        if m.name in self._ended:
+            self.stats[m.name]["idle"] += now - self._ended[m.name]
+        self._started[m.name] = (now, time.process_time())
+
+    def _after_run(self, m: Module, run_number: int) -> None:
+        now = time.perf_counter()
+        if m.name not in self._started:
+            return
+        wall, cpu = self._started.pop(m.name)
+        stats = self.stats[m.name]
+        stats["runs"] += 1
+        stats["wall"] += now - wall
+        stats["cpu"] += time.process_time() - cpu
+        consumed = self._consumed(m)
+        # min and max are modules in this notebook, do not use the builtins
+        rows = consumed - self._consumed_rows.get(m.name, 0)
+        if rows > 0:  # the inputs are reset when rows are updated or deleted
+            stats["rows"] += rows
+        self._consumed_rows[m.name] = consumed
+        self._ended[m.name] = now
+        self.events.append((m.name, wall - self._origin, now - wall))
+
+    @staticmethod
+    def _consumed(m: Module) -> int:
+        # Rows of the input tables processed so far, or rows loaded for a loader
+        if m.is_data_input():
+            return m.get_progress()[0]
+        consumed = 0
+        for slot in m.input_slot_values():
+            if slot is None:
+                continue
+            data = slot.data()
+            if data is None or isinstance(data, PDict):
+                continue
+            consumed += len(data) - slot.created.length()
+        return consumed
+
+    def table(self) -> pd.DataFrame:
+        df = pd.DataFrame.from_dict(self.stats, orient="index")
+        df["wall_per_run"] = df["wall"] / df["runs"]
+        df["cpu_per_run"] = df["cpu"] / df["runs"]
+        df["rows_per_s"] = df["rows"] / df["wall"]
+        return df.sort_values("wall", ascending=False)
+
+    def export_trace(self, filename: str) -> None:
+        # Chrome trace event format, times are in microseconds
+        trace = [
+            {"name": name, "ph": "X", "ts": start * 1e6, "dur": duration * 1e6, "pid": 0, "tid": 0}
+            for (name, start, duration) in self.events
+        ]
+        with open(filename, "w") as out:
+            json.dump({"traceEvents": trace}, out)
+
+    def to_graphviz(self) -> str:
+        # Same graph as scheduler.to_graphviz(), annotated with the measures
+        total = sum(stats["wall"] for stats in self.stats.values()) or 1.0
+        lines = ["digraph progressivis {", "  node [shape=box];"]
+        for mod in self.modules:
+            stats = self.stats[mod.name]
+            rate = stats["rows"] / stats["wall"] if stats["wall"] else 0.0
+            share = 100 * stats["wall"] / total
+            lines.append(
+                f'  "{mod.name}" [label="{mod.name}\\n{rate:,.0f} rows/s\\n{share:.1f}% of time"'
+                f', penwidth={1 + share / 10:.1f}];'
+            )
+        for mod in self.modules:
+            for slot in mod.input_slot_values():  # only the connected slots
+                if slot is None:
+                    continue
+                # Rows created on the input but not yet processed by the module
+                backlog = slot.created.length()
+                lines.append(
+                    f'  "{slot.output_module.name}" -> "{mod.name}"'
+                    f' [label="{slot.input_name}\\n{backlog:,} waiting"];'
+                )
+        lines.append("}")
+        return "\n".join(lines)
+
+
+# %%
+profiler = ModuleProfiler(list(csv.scheduler.modules().values()))
+
+# %% [markdown]
+# Let the scheduler run for a while, then show the table sorted by wall time.
+# Uncomment the last line to save the trace.
+
+# %%
+profiler.table()
+
+# %%
+# profiler.export_trace("userguide1.4-trace.json")
+
+# %% [markdown]
+# ## Visualizing the Bottlenecks
+# The profiler can also produce the Dataflow graph annotated with the throughput and the share of time of each module,
+# and the number of rows waiting to be processed on each input slot.
+# It only reads counters, so it can be refreshed periodically while the scheduler runs.
+
+# %%
+try:
+    import graphviz
+    display(graphviz.Source(profiler.to_graphviz()))
+except ImportError:
+    pass
+
 # %% [markdown]
 # ## Stop the scheduler
 # To stop the scheduler, uncomment the next cell and run it
@@ -0,0 +1,207 @@
+"""
+Module computing progressively the correlation of all the columns of a table.
+
+It maintains the count, the means and the co-moments of the columns,
+merging the statistics of each new chunk, so each run costs
+O(chunk x columns^2) regardless of the number of rows already processed.
+The statistics are (count, mean, comoment) triples; `combine` merges two
+of them, whether they come from chunks or from other workers.
+Rows with NaN or inf values are ignored, like np.fmax in SimpleMax.
+Like SimpleMax v3, it is reset when rows are updated or deleted.
+It does support slot hints and quality.
+"""
+from typing import Any, Dict, List, Tuple
+import numpy as np
+from progressivis import (
+    Module, ReturnRunStep, PTable, PDict,
+    def_input, def_output
+)
+from progressivis.core.decorators import process_slot, run_if_any
+from progressivis.core.utils import indices_len, fix_loc
+
+
+Moments = Tuple[int, np.ndarray, np.ndarray]  # count, mean, comoment
+
+
+def moments(values: np.ndarray) -> Moments:
+    "Return the statistics of the rows of a 2D array without NaN or inf"
+    values = values[np.isfinite(values).all(axis=1)]  # avoids propagation of Nan
+    if len(values) == 0:
+        zeros = np.zeros(values.shape[1])
+        return 0, zeros, np.outer(zeros, zeros)
+    mean = values.mean(axis=0)
+    centered = values - mean
+    return len(values), mean, centered.T @ centered
+
+
+def combine(a: Moments, b: Moments) -> Moments:
+    "Merge two statistics, see Chan et al. pairwise algorithm"
+    count_a, mean_a, comoment_a = a
+    count_b, mean_b, comoment_b = b
+    if count_a == 0:
+        return b
+    if count_b == 0:
+        return a
+    count = count_a + count_b
+    delta = mean_b - mean_a
+    mean = mean_a + delta * (count_b / count)
+    comoment = (
+        comoment_a + comoment_b
+        + np.outer(delta, delta) * (count_a * count_b / count)
+    )
+    return count, mean, comoment
+
+
+@def_input("table", PTable, doc="The input PTable to process")
+@def_output("result", PDict, doc=("PDict with the correlation of each pair of columns"))
+class SimpleCorr(Module):
+    def __init__(self, **kwds: Any) -> None:
+        super().__init__(**kwds)
+        self.default_step_size = 10000
+        self.quality: Dict[str, float] = {}
+        self.reset()
+
+    def reset(self) -> None:
+        self.columns: List[str] = []
+        self.count = 0
+        self.mean: np.ndarray | None = None
+        self.comoment: np.ndarray | None = None
+        self.corr: np.ndarray | None = None
+        self.change = 2.0  # largest change of a coefficient in the last run
+
+    def merge(self, other: Moments) -> None:
+        "Merge statistics computed elsewhere, e.g., on a chunk or by a worker"
+        if self.mean is None or self.comoment is None:
+            self.count, self.mean, self.comoment = other
+        else:
+            self.count, self.mean, self.comoment = combine(
+                (self.count, self.mean, self.comoment), other
+            )
+
+    @process_slot("table", reset_cb="reset")
+    @run_if_any
+    def run_step(
+        self, run_number: int, step_size: int, quantum: float
+    ) -> ReturnRunStep:
+        assert self.context
+        with self.context as ctx:
+            indices = ctx.table.created.next(length=step_size)
+            steps = indices_len(indices)
+            chunk = self.filter_slot_columns(ctx.table, fix_loc(indices))
+            if steps == 0:
+                return self._return_run_step(self.next_state(ctx.table), steps)
+            self.columns = list(chunk.columns)
+            self.merge(moments(chunk.to_array().astype("float64")))
+            if self.count == 0:  # only rows with NaN so far
+                return self._return_run_step(self.next_state(ctx.table), steps)
+            assert self.comoment is not None
+            std = np.sqrt(np.diag(self.comoment))
+            with np.errstate(divide="ignore", invalid="ignore"):
+                corr = self.comoment / np.outer(std, std)
+            if self.corr is not None:
+                diff = np.abs(corr - self.corr)
+                # NaN for constant columns, they do not change
+                self.change = 0.0 if np.isnan(diff).all() else float(np.nanmax(diff))
+            self.corr = corr
+            result = {
+                f"{x}:{y}": float(corr[i, j])
+                for i, x in enumerate(self.columns)
+                for j, y in enumerate(self.columns)
+                if i < j
+            }
+            if self.result is None:
+                self.result = PDict(result)
+            else:
+                self.result.update(result)
+            return self._return_run_step(self.next_state(ctx.table), steps)
+
+    def get_quality(self) -> Dict[str, float] | None:
+        if self.corr is None:
+            return None
+        # The quality is the opposite of the largest change of a
+        # coefficient in the last run; it should grow toward 0.
+        self.quality["corr"] = -self.change
+        return self.quality
+
+
+def _test_corr():
+    from progressivis import Print, RandomPTable, Scheduler
+    from progressivis.core import aio
+    s = Scheduler()
+    random = RandomPTable(3, rows=100_000, scheduler=s)
+    corr = SimpleCorr(name="corr_" + str(hash(random)), scheduler=s)
+    corr.input[0] = random.output.result
+    pr = Print(proc=_terse, scheduler=s)
+    pr.input[0] = corr.output.result
+    aio.run(s.start())
+    assert random.result is not None
+    assert corr.corr is not None
+    res1 = np.corrcoef(random.result.to_array(), rowvar=False)
+    assert np.allclose(res1, corr.corr)
+
+
+def _test_corr_cols():
+    from progressivis import Print, RandomPTable, Scheduler
+    from progressivis.core import aio
+    s = Scheduler()
+    random = RandomPTable(10, rows=100_000, scheduler=s)
+    corr = SimpleCorr(name="corr_" + str(hash(random)), scheduler=s)
+    corr.input[0] = random.output.result["_1", "_2", "_3"]
+    pr = Print(proc=_terse, scheduler=s)
+    pr.input[0] = corr.output.result
+    aio.run(s.start())
+    assert random.result is not None
+    assert corr.result is not None
+    res1 = np.corrcoef(
+        random.result.loc[:, ["_1", "_2", "_3"]].to_array(), rowvar=False
+    )
+    assert np.isclose(res1[0, 1], corr.result["_1:_2"])
+    assert np.isclose(res1[0, 2], corr.result["_1:_3"])
+    assert np.isclose(res1[1, 2], corr.result["_2:_3"])
+
+
+def _test_corr_nan():
+    import pandas as pd
+    from progressivis import Constant, Print, Scheduler
+    from progressivis.core import aio
+    rng = np.random.default_rng(0)
+    values = rng.random((10_000, 3))
+    values[rng.random(values.shape) < 0.01] = np.nan
+    s = Scheduler()
+    table = PTable("corr_nan", data=pd.DataFrame(values, columns=["a", "b", "c"]))
+    cst = Constant(table, scheduler=s)
+    corr = SimpleCorr(scheduler=s)
+    corr.input[0] = cst.output.result
+    pr = Print(proc=_terse, scheduler=s)
+    pr.input[0] = corr.output.result
+    aio.run(s.start())
+    assert corr.corr is not None
+    finite = values[np.isfinite(values).all(axis=1)]
+    assert np.allclose(np.corrcoef(finite, rowvar=False), corr.corr)
+    quality = corr.get_quality()
+    assert quality is not None and np.isfinite(quality["corr"])
+
+
+def _test_combine():
+    rng = np.random.default_rng(0)
+    values = rng.random((10_000, 4))
+    # Statistics of parts, e.g., computed by several workers, merged in any order
+    parts = [moments(part) for part in np.array_split(values, 7)]
+    total = parts[0]
+    for part in parts[1:]:
+        total = combine(part, total)
+    count, mean, comoment = total
+    assert count == len(values)
+    assert np.allclose(mean, values.mean(axis=0))
+    assert np.allclose(comoment / (count - 1), np.cov(values, rowvar=False))
+
+
+def _terse(_):
+    print(".", end="", flush=True)
+
+
+if __name__ == "__main__":
+    _test_combine()
+    _test_corr()
+    _test_corr_cols()
+    _test_corr_nan()
@@ -0,0 +1,207 @@
+"""
+Module loading progressively a small CSV file.
+
+This implementation adds an opt-in narrowing of the float columns to float32.
+Integer columns are left unchanged: the PTable columns are created with the
+first chunk and cannot be widened later, so a type chosen from the first
+chunk would make the load fail when a later chunk holds larger values.
+"""
+from __future__ import annotations
+
+import logging
+import numpy as np  # v2
+import pandas as pd
+from progressivis import ProgressiveError
+from progressivis.core.docstrings import RESULT_DOC
+from progressivis.utils.inspect import filter_kwds
+from progressivis.core.module import Module
+from progressivis.core.module import ReturnRunStep, def_output
+from progressivis.core.utils import force_valid_id_columns
+from progressivis.table.table import PTable
+from progressivis.table.dshape import dshape_from_dataframe
+
+from typing import (Dict, Any, Tuple)
+
+logger = logging.getLogger(__name__)
+
+
+def _fits_float32(column: pd.Series) -> bool:  # v2
+    if column.dtype.kind not in "iuf":
+        return False
+    values = column[np.isfinite(column)]
+    return len(values) == 0 or bool(np.abs(values).max() <= np.finfo(np.float32).max)
+
+
+@def_output("result", PTable, doc=RESULT_DOC)
+class SmallCSVLoaderV2(Module):
+    def __init__(
+        self, filepath_or_buffer: Any, narrow_dtypes: bool = False, **kwds: Any
+    ) -> None:
+        if "index_col" in kwds:
+            raise ProgressiveError("'index_col' parameter is not supported")
+        super().__init__(**kwds)
+        self.default_step_size = 1000
+        chunksize_ = kwds.get("chunksize")
+        if isinstance(chunksize_, int):  # initial guess
+            self.default_step_size = chunksize_
+        if chunksize_ is None:
+            kwds["chunksize"] = self.default_step_size
+        else:
+            kwds.setdefault("chunksize", self.default_step_size)
+        # Filter out the module keywords from the csv loader keywords
+        csv_kwds: Dict[str, Any] = filter_kwds(kwds, pd.read_csv)
+        self.parser = pd.read_csv(filepath_or_buffer, **csv_kwds)
+        self._rows_read = 0
+        self.narrow_dtypes = narrow_dtypes  # v2
+        self._dtypes: Dict[str, np.dtype] | None = None  # v2
+        self._bytes_saved = 0  # v2
+        self.result: PTable | None  # to help mypy
+
+    def rows_read(self) -> int:
+        return self._rows_read
+
+    def bytes_saved(self) -> int:  # v2
+        return self._bytes_saved
+
+    def narrow(self, df: pd.DataFrame) -> pd.DataFrame:  # v2
+        if self._dtypes is None:  # the float columns of the first chunk
+            self._dtypes = {
+                col: np.dtype(np.float32)
+                for col in df.columns
+                if df[col].dtype.kind == "f"
+            }
+        for col in self._dtypes:
+            if not _fits_float32(df[col]):
+                # Only values beyond 3.4e38 or non numeric values end up here
+                raise ProgressiveError(
+                    f"Column '{col}' does not fit in float32, "
+                    "use narrow_dtypes=False to load this file"
+                )
+        before = df.memory_usage(index=False).sum()
+        df = df.astype(self._dtypes)
+        self._bytes_saved += int(before - df.memory_usage(index=False).sum())
+        return df
+
+    def is_data_input(self) -> bool:
+        return True
+
+    def run_step(
+        self, run_number: int, step_size: int, quantum: float
+    ) -> ReturnRunStep:
+        if step_size == 0:  # bug
+            return self._return_run_step(self.state_ready, steps_run=0)
+        try:
+            df = self.parser.read(step_size)
+        except StopIteration:
+            return self._return_run_step(self.state_zombie, steps_run=0)
+        except ValueError:
+            raise
+        creates = len(df)
+        if creates == 0:  # should not happen
+            logger.error("Received 0 elements")
+            return self._return_run_step(self.state_zombie, steps_run=0)
+        self._rows_read += creates
+        force_valid_id_columns(df)  # fix column names
+        if self.narrow_dtypes:  # v2
+            df = self.narrow(df)
+        if self.result is None:  # create the PTable
+            self.result = PTable(
+                name=self.generate_table_name("table"),
+                dshape=dshape_from_dataframe(df),  # infer types
+                data=df,
+                create=True
+            )
+        else:
+            self.result.append(df)
+        return self._return_run_step(self.state_ready, steps_run=creates)
+
+    def get_progress_FAKE(self) -> Tuple[int, int]:
+        input_size = self.parser._input._input_size
+        if input_size == 0:
+            return (0, 0)
+        pos = self.parser._input._stream.tell()
+        length = len(self.result)
+        estimated_row_size = pos / length
+        estimated_size = int(input_size / estimated_row_size)
+        return (length, estimated_size)
+
+
+def _test_1():
+    from progressivis.core import aio
+    from progressivis import Scheduler, get_dataset, Sink
+    s = Scheduler()
+    module = SmallCSVLoaderV2(get_dataset("bigfile"), header=None, scheduler=s)
+    sink = Sink(name="sink", scheduler=s)
+    sink.input.inp = module.output.result
+    aio.run(s.start())
+    assert module.result is not None
+    assert len(module.result) == 1_000_000
+
+
+def _test_2():
+    from progressivis.core import aio
+    from progressivis import Scheduler, Sink
+    from progressivis.core.utils import RandomBytesIO
+    s = Scheduler()
+    length = 30_000
+    module = SmallCSVLoaderV2(
+        RandomBytesIO(cols=30, rows=length),
+        header=None,
+        scheduler=s,
+    )
+    sink = Sink(name="sink", scheduler=s)
+    sink.input.inp = module.output.result
+    aio.run(s.start())
+    assert module.result is not None
+    assert len(module.result) == length
+
+
+def _test_3():  # v2
+    from progressivis.core import aio
+    from progressivis import Scheduler, Sink
+    from progressivis.core.utils import RandomBytesIO
+    s = Scheduler()
+    length = 30_000
+    module = SmallCSVLoaderV2(
+        RandomBytesIO(cols=30, rows=length),
+        header=None,
+        narrow_dtypes=True,
+        scheduler=s,
+    )
+    sink = Sink(name="sink", scheduler=s)
+    sink.input.inp = module.output.result
+    aio.run(s.start())
+    assert module.result is not None
+    assert len(module.result) == length
+    for col in module.result.columns:
+        assert module.result[col].dtype == np.float32
+    assert module.bytes_saved() == length * 30 * 4
+
+
+def _test_4():  # v2
+    import io
+    from progressivis.core import aio
+    from progressivis import Scheduler, Sink
+    s = Scheduler()
+    length = 100_000
+    # The ids of the first chunk fit in int16, the later ones do not
+    csv = pd.DataFrame({"id": np.arange(length), "x": np.random.rand(length)})
+    module = SmallCSVLoaderV2(
+        io.StringIO(csv.to_csv(index=False)),
+        narrow_dtypes=True,
+        scheduler=s,
+    )
+    sink = Sink(name="sink", scheduler=s)
+    sink.input.inp = module.output.result
+    aio.run(s.start())
+    assert module.result is not None
+    assert len(module.result) == length
+    assert module.result["id"].dtype == np.int64
+    assert module.result["x"].dtype == np.float32
+
+
+if __name__ == "__main__":
+    _test_1()
+    _test_2()
+    _test_3()
+    _test_4()